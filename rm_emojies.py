@@ -90,43 +90,219 @@
 # if __name__ == "__main__":
 #     main()
 
+import codecs
+import functools
+import os
 import pathlib
+import re
 import unicodedata
 import argparse
 import sys
+from concurrent.futures import ProcessPoolExecutor
+
+# Allowed categories:
+# L = Letters (All languages)
+# N = Numbers
+# P = Punctuation
+# Z = Separators (Spaces)
+ALLOWED_CATEGORIES = ('L', 'N', 'P', 'Z')
+
+# Explicitly keep essential whitespace characters
+ALLOWED_CONTROL = ('\n', '\r', '\t')
+
+def _is_allowed(char):
+    return unicodedata.category(char)[0] in ALLOWED_CATEGORIES or char in ALLOWED_CONTROL
+
+# One byte per BMP code point (1 = keep), computed once at import time.
+# Nearly all .md/.txt content lives in the BMP, so this table is the single
+# source of truth for classification; unicodedata is only consulted above it.
+_BMP_OK = bytes(_is_allowed(chr(code)) for code in range(0x10000))
+
+def _build_clean_pattern():
+    """
+    Builds one character class matching every BMP code point outside the
+    whitelist. The stdlib `re` has no \\p{...} support, so the ranges are
+    read from the _BMP_OK table. Keeping the class inside the BMP lets `re`
+    compile it to a bitmap instead of a range list.
+    """
+    ranges = []
+    start = None
+    for code, keep in enumerate(_BMP_OK):
+        if keep:
+            if start is not None:
+                ranges.append((start, code - 1))
+                start = None
+        elif start is None:
+            start = code
+    if start is not None:
+        ranges.append((start, 0xFFFF))
+
+    body = "".join(
+        f"\\u{low:04x}" if low == high else f"\\u{low:04x}-\\u{high:04x}"
+        for low, high in ranges
+    )
+    return re.compile(f"[{body}]+")
+
+# Compiled once so every file in run_cleaner shares the same scanners
+_CLEAN_RE = _build_clean_pattern()
+
+# Code points above the BMP (mostly emojis) are rare, so they are
+# only classified one by one when a run of them is found
+_ASTRAL_RE = re.compile('[\U00010000-\U0010ffff]+')
+
+class _AstralDropTable(dict):
+    """
+    str.translate table for code points above the BMP. Entries are
+    classified on first sight and cached, so each distinct emoji is only
+    looked up in unicodedata once.
+    """
+    def __missing__(self, code):
+        self[code] = value = code if _is_allowed(chr(code)) else None
+        return value
+
+_ASTRAL_DROP = _AstralDropTable()
+
+# The same few emoji sequences repeat throughout a document, so the
+# cleaned form of each distinct run is memoized in C by lru_cache
+@functools.lru_cache(maxsize=4096)
+def _clean_astral_run(run):
+    return run.translate(_ASTRAL_DROP)
+
+def _filter_astral(match):
+    return _clean_astral_run(match.group())
+
+# ASCII is unaffected by NFD/NFC, so only the disallowed characters
+# (control codes and symbols like '$' or '~') need to be deleted
+_ASCII_DROP = {code: None for code in range(128) if not _BMP_OK[code]}
+
+def _is_already_clean(text):
+    """
+    Unicode Quick Check: text that is stable under both NFD and NFC and
+    holds no disallowed characters would come out of the full pipeline
+    unchanged.
+    """
+    return (
+        unicodedata.is_normalized('NFD', text)
+        and unicodedata.is_normalized('NFC', text)
+        and _CLEAN_RE.search(text) is None
+        and _ASTRAL_RE.search(text) is None
+    )
 
 def deep_clean_text(text):
     """
-    Decomposes Unicode characters and keeps only letters, numbers, 
+    Decomposes Unicode characters and keeps only letters, numbers,
     punctuation, and whitespace. Everything else is discarded.
     """
-    # NFD (Normalization Form Decomposition) breaks "8️⃣" into 
+    # Plain ASCII files skip the normalization roundtrip entirely
+    if text.isascii():
+        return text.translate(_ASCII_DROP)
+
+    if _is_already_clean(text):
+        return text
+
+    # NFD (Normalization Form Decomposition) breaks "8️⃣" into
     # the character '8' and the combining symbols.
     decomposed_text = unicodedata.normalize('NFD', text)
-    
-    # Allowed categories:
-    # L = Letters (All languages)
-    # N = Numbers
-    # P = Punctuation
-    # Z = Separators (Spaces)
-    allowed_categories = ('L', 'N', 'P', 'Z')
-    
-    # Explicitly keep essential whitespace characters
-    allowed_control = ('\n', '\r', '\t')
-    
-    clean_chars = []
-    for char in decomposed_text:
-        category = unicodedata.category(char)
-        
-        # We keep the character only if it is a basic text category
-        # or an allowed control character.
-        if category[0] in allowed_categories or char in allowed_control:
-            clean_chars.append(char)
-    
+
+    # Drop every run of disallowed characters in a single C-level pass
+    result = _CLEAN_RE.sub('', decomposed_text)
+    result = _ASTRAL_RE.sub(_filter_astral, result)
+
     # Re-normalize back to NFC (Normal Form Composed) for the final string
-    result = "".join(clean_chars)
     return unicodedata.normalize('NFC', result)
 
+# Files are streamed in chunks of this many bytes so peak memory
+# stays bounded no matter how large a single file is
+CHUNK_SIZE = 1 << 20
+
+def _joins_previous(char):
+    """
+    True for characters a chunk must not start with. Hangul medial vowels
+    and trailing consonants are the only kept characters that NFC composes
+    with the one before them, and anything the filter deletes can bring
+    two such jamo together.
+    """
+    if '\u1161' <= char <= '\u1175' or '\u11a8' <= char <= '\u11c2':
+        return True
+    code = ord(char)
+    if code < 0x10000:
+        return not _BMP_OK[code]
+    return _ASTRAL_DROP[code] is None
+
+def _split_point(chunk):
+    """
+    Finds where a chunk can be cut without changing how it normalizes.
+    Combining marks are always dropped by the filter, so the only hazard
+    is NFC composing two kept characters across the cut: conjoining
+    Hangul jamo. The cut goes right after the last newline, or for very
+    long lines, before the last character that does not join its
+    predecessor. A chunk with no such character at all is cut at its end
+    to keep memory bounded.
+    """
+    cut = chunk.rfind('\n') + 1
+    if cut:
+        return cut
+
+    cut = len(chunk) - 1
+    while cut > 0 and _joins_previous(chunk[cut]):
+        cut -= 1
+    return cut or len(chunk)
+
+def clean_file(source, destination):
+    """
+    Reads, cleans and writes a single file. Lives at module level so it
+    can be pickled and shipped to the worker processes in run_cleaner.
+    Returns None on success, or the error message on failure.
+    """
+    # Decode UTF-8 by hand, replacing errors to prevent script crashes.
+    # Binary I/O skips the text layer's newline translation, and the
+    # incremental decoder keeps multi-byte sequences split across reads.
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    try:
+        with open(source, 'rb') as reader, open(destination, 'wb') as writer:
+            pending = ''
+            while True:
+                data = reader.read(CHUNK_SIZE)
+                chunk = pending + decoder.decode(data, final=not data)
+                if not data:
+                    break
+
+                # Carry the unsafe tail over to the next read
+                cut = _split_point(chunk)
+                pending = chunk[cut:]
+
+                # Apply the whitelist filter and write the output
+                writer.write(deep_clean_text(chunk[:cut]).encode('utf-8'))
+
+            writer.write(deep_clean_text(chunk).encode('utf-8'))
+    except Exception as error:
+        return str(error)
+    return None
+
+# The file types you specified
+TEXT_SUFFIXES = ('.md', '.txt')
+
+def _walk_text_files(directory):
+    """
+    Yields the paths of matching files under a directory. os.scandir reads
+    the entry type from the directory listing itself, so skipped entries
+    cost neither a stat() call nor a Path object. Like Path.rglob, it does
+    not descend into symlinked directories and skips unreadable ones.
+    """
+    # The listing is copied out so no directory handle stays open while
+    # the nested generators of a deep tree are suspended
+    try:
+        with os.scandir(directory) as it:
+            entries = list(it)
+    except PermissionError:
+        return
+
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from _walk_text_files(entry.path)
+        elif os.path.splitext(entry.name)[1].lower() in TEXT_SUFFIXES and entry.is_file():
+            yield entry.path
+
 def run_cleaner(input_directory, output_directory):
     """
     Recursively scans the input directory and mirrors it in the output directory.
@@ -141,29 +317,33 @@ def run_cleaner(input_directory, output_directory):
     print(f"Purging symbols from: {base_in}")
     print(f"Saving clean files to: {base_out}")
 
+    sources = []
+    destinations = []
+    for source in _walk_text_files(base_in):
+        file_path = pathlib.Path(source)
+
+        # Calculate the relative path to maintain folder hierarchy
+        relative_path = file_path.relative_to(base_in)
+
+        sources.append(file_path)
+        destinations.append(base_out / relative_path)
+
+    # Most files share a parent, so each output subdirectory is created
+    # once here, before any worker writes, instead of once per file
+    for directory in sorted({destination.parent for destination in destinations}):
+        directory.mkdir(parents=True, exist_ok=True)
+
+    # Every file is independent and the filter is CPU-bound, so the files
+    # are spread across one process per core. chunksize amortizes the
+    # pickling overhead of sending many small tasks.
     file_count = 0
-    for file_path in base_in.rglob('*'):
-        # Filter for the file types you specified
-        if file_path.is_file() and file_path.suffix.lower() in ('.md', '.txt'):
-            # Calculate the relative path to maintain folder hierarchy
-            relative_path = file_path.relative_to(base_in)
-            destination = base_out / relative_path
-
-            # Ensure the output subdirectory exists
-            destination.parent.mkdir(parents=True, exist_ok=True)
-
-            try:
-                # Read with UTF-8, replacing errors to prevent script crashes
-                raw_content = file_path.read_text(encoding='utf-8', errors='replace')
-                
-                # Apply the whitelist filter
-                sanitized_content = deep_clean_text(raw_content)
-                
-                # Write the output
-                destination.write_text(sanitized_content, encoding='utf-8')
-                print(f"Cleaned: {relative_path}")
+    with ProcessPoolExecutor() as executor:
+        results = executor.map(clean_file, sources, destinations, chunksize=16)
+        for file_path, error in zip(sources, results):
+            if error is None:
+                print(f"Cleaned: {file_path.relative_to(base_in)}")
                 file_count += 1
-            except Exception as error:
+            else:
                 print(f"Failed to process {file_path.name}: {error}")
 
     print(f"\nTask complete. {file_count} files processed.")
@@ -1,5 +1,9 @@
 import os
 import re
+import json
+import atexit
+import hashlib
+import shelve
 import pandas as pd
 import duckdb
 from openai import AzureOpenAI
@@ -18,6 +22,13 @@ api_version = "2024-02-15-preview"
 
 DB_PATH = "temp_data.duckdb"
 TABLE_NAME = "uploaded_data"
+SQL_CACHE_PATH = ".sql_cache"
+
+NUMERIC_TYPES = {
+    "TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT",
+    "UTINYINT", "USMALLINT", "UINTEGER", "UBIGINT",
+    "FLOAT", "DOUBLE",
+}
 
 if not api_key or not azure_endpoint:
     raise RuntimeError("Azure OpenAI configuration is missing.")
@@ -28,6 +39,22 @@ client = AzureOpenAI(
     api_key=api_key,
 )
 
+# =========================================================
+# CONNECTION SECTION  (Later → db_manager.py)
+# =========================================================
+
+_connection = None
+
+
+def get_connection():
+    # One connection is reused for the whole session so DuckDB keeps its
+    # catalog and buffer pool warm between interactive queries
+    global _connection
+    if _connection is None:
+        _connection = duckdb.connect(DB_PATH)
+        atexit.register(_connection.close)
+    return _connection
+
 # =========================================================
 # FILE LOADING SECTION  (Later → data_loader.py)
 # =========================================================
@@ -48,13 +75,14 @@ def load_file(file_path):
 
 def clean_data(df):
     df.columns = df.columns.str.strip()
-    df.replace("", pd.NA, inplace=True)
 
-    for col in df.columns:
-        if df[col].dtype == "object":
-            df[col] = df[col].fillna("Unknown")
-        else:
-            df[col] = df[col].fillna(df[col].median())
+    # One vectorized call per dtype group instead of one write per column;
+    # all medians are computed in a single pass
+    text_cols = df.select_dtypes(include="object").columns
+    other_cols = df.columns.difference(text_cols, sort=False)
+
+    df[text_cols] = df[text_cols].replace("", pd.NA).fillna("Unknown")
+    df[other_cols] = df[other_cols].fillna(df[other_cols].median())
 
     return df
 
@@ -63,22 +91,12 @@ def clean_data(df):
 # METADATA SECTION  (Later → metadata.py)
 # =========================================================
 
-def extract_dataframe_metadata(df):
-    return {
-        "columns": list(df.columns),
-        "dtypes": df.dtypes.astype(str).to_dict(),
-        "sample_rows": df.head(5).to_dict(orient="records")
-    }
-
-
 def extract_metadata_from_db(table_name=TABLE_NAME):
-    con = duckdb.connect(DB_PATH)
+    con = get_connection()
 
     schema = con.execute(f"DESCRIBE {table_name}").fetchdf()
     sample = con.execute(f"SELECT * FROM {table_name} LIMIT 3").fetchdf()
 
-    con.close()
-
     metadata = {
         "columns": schema["column_name"].tolist(),
         "dtypes": dict(zip(schema["column_name"], schema["column_type"])),
@@ -92,61 +110,98 @@ def extract_metadata_from_db(table_name=TABLE_NAME):
 # LLM UTILITIES SECTION  (Later → llm_utils.py)
 # =========================================================
 
+SQL_MARKDOWN_RE = re.compile(r"```(?:\w+)?\s*(.*?)```", re.IGNORECASE | re.DOTALL)
+
+
 def strip_sql_markdown(text: str) -> str:
-    pattern = r"```(?:\w+)?\s*(.*?)```"
-    match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
+    match = SQL_MARKDOWN_RE.search(text)
     if match:
         return match.group(1).strip()
     return text.strip()
 
 
-# =========================================================
-# TABLE CREATION SECTION  (Later → schema_generator.py)
-# =========================================================
-
-def generate_create_table_sql(metadata, table_name=TABLE_NAME):
-    system_prompt = f"""
-You are a SQL expert.
-Generate a DuckDB CREATE TABLE statement.
-
-Table Name: {table_name}
+# Generated SQL is persisted across sessions: with temperature=0 the same
+# prompt yields the same query, so a repeat question skips the LLM call
+_sql_cache = None
 
-Columns: {metadata['columns']}
-Types: {metadata['dtypes']}
-Sample Rows: {metadata['sample_rows']}
 
-Return ONLY valid SQL.
-"""
+def get_sql_cache():
+    # Opened on first use so importing the module creates no files
+    global _sql_cache
+    if _sql_cache is None:
+        _sql_cache = shelve.open(SQL_CACHE_PATH)
+        atexit.register(_sql_cache.close)
+    return _sql_cache
 
-    response = client.chat.completions.create(
-        model=deployment,
-        messages=[{"role": "system", "content": system_prompt}],
-        temperature=0
-    )
-    maintain_tokens_count(response)
-    print("[CREATE TABLE LLM CALL]")
 
-    return strip_sql_markdown(response.choices[0].message.content.strip())
+def prompt_cache_key(*messages):
+    payload = json.dumps([deployment, *messages])
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
 
 
 # =========================================================
 # DATABASE SECTION  (Later → db_manager.py)
 # =========================================================
 
-def store_table(df, create_sql, table_name=TABLE_NAME):
-    con = duckdb.connect(DB_PATH)
+def store_table(df, table_name=TABLE_NAME):
+    con = get_connection()
 
     con.execute(f"DROP TABLE IF EXISTS {table_name}")
-    con.execute(create_sql)
 
-    con.register("temp_df", df)
-    con.execute(f"INSERT INTO {table_name} SELECT * FROM temp_df")
+    # DuckDB infers the schema from the DataFrame and scans its column
+    # buffers in place, so the rows are copied exactly once: into the table
+    con.from_df(df).create(table_name)
+
+
+def quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def load_and_clean_into_duckdb(file_path, table_name=TABLE_NAME):
+    # Same rules as clean_data, but evaluated by DuckDB's multi-threaded
+    # CSV reader and vectorized engine instead of pandas
+    con = get_connection()
+    staging_table = f"{table_name}_raw"
+
+    # The CSV is parsed once into a staging table, so the NULL counts
+    # below are a cheap columnar scan instead of a second parse
+    con.execute(f"DROP TABLE IF EXISTS {staging_table}")
+    source = con.read_csv(file_path)
+    source.create(staging_table)
+
+    null_counts = con.execute(
+        "SELECT "
+        + ", ".join(f"count(*) - count({quote_identifier(column)})" for column in source.columns)
+        + f" FROM {staging_table}"
+    ).fetchone()
+
+    select_list = []
+    for column, column_type, null_count in zip(source.columns, source.types, null_counts):
+        quoted = quote_identifier(column)
+        type_name = str(column_type)
+        is_numeric = type_name in NUMERIC_TYPES or type_name.startswith("DECIMAL")
+
+        if type_name == "VARCHAR":
+            expression = f"COALESCE(NULLIF({quoted}, ''), 'Unknown')"
+        elif is_numeric and null_count:
+            # median() returns DOUBLE, so like pandas only columns that
+            # actually have gaps are widened by the fill
+            expression = f"COALESCE({quoted}, median({quoted}) OVER ())"
+        else:
+            expression = quoted
 
-    con.close()
+        select_list.append(f"{expression} AS {quote_identifier(column.strip())}")
+
+    con.execute(f"DROP TABLE IF EXISTS {table_name}")
+    con.execute(
+        f"CREATE TABLE {table_name} AS "
+        f"SELECT {', '.join(select_list)} FROM {staging_table}"
+    )
+    con.execute(f"DROP TABLE {staging_table}")
 
 
 def verify_table(table_name=TABLE_NAME):
-    con = duckdb.connect(DB_PATH)
+    con = get_connection()
 
     print("\n--- Verification (First 20 Rows) ---\n")
     result = con.execute(
@@ -155,34 +210,36 @@ def verify_table(table_name=TABLE_NAME):
 
     print(result)
 
-    con.close()
-
 
 def execute_query(query):
-    con = duckdb.connect(DB_PATH)
-    result = con.execute(query).fetchdf()
-    con.close()
-    return result
+    con = get_connection()
+    return con.execute(query).fetchdf()
 
 
 # =========================================================
 # ANALYSIS SECTION  (Later → query_engine.py)
 # =========================================================
 
+FORBIDDEN_KEYWORDS_RE = re.compile(
+    r"\b(?:INSERT|UPDATE|DELETE|DROP|ALTER|CREATE)\b", re.IGNORECASE
+)
+
+
 def is_safe_query(query: str) -> bool:
-    forbidden = ["INSERT", "UPDATE", "DELETE", "DROP", "ALTER", "CREATE"]
-    upper_query = query.upper()
-    return not any(keyword in upper_query for keyword in forbidden)
+    return FORBIDDEN_KEYWORDS_RE.search(query) is None
+
+
+LIMIT_RE = re.compile(r"\bLIMIT\b", re.IGNORECASE)
 
 
 def enforce_limit(query: str, limit=10):
-    if "LIMIT" not in query.upper():
+    if LIMIT_RE.search(query) is None:
         query = query.rstrip(";") + f" LIMIT {limit};"
     return query
 
 
-def generate_select_sql(user_query, metadata, table_name=TABLE_NAME):
-    system_prompt = f"""
+def build_select_prompt(metadata, table_name=TABLE_NAME):
+    return f"""
 You are a DuckDB SQL expert.
 
 You must generate ONLY a SELECT query.
@@ -201,6 +258,26 @@ Sample Rows : {metadata['sample_rows']}
 Return ONLY SQL.
 """
 
+
+def select_cache_key(user_query, metadata, table_name=TABLE_NAME):
+    return prompt_cache_key(build_select_prompt(metadata, table_name), user_query.strip())
+
+
+def cache_select_sql(user_query, metadata, select_sql, table_name=TABLE_NAME):
+    # Only called once the query has passed the safety check and run, so a
+    # bad generation is retried next time instead of being replayed forever
+    get_sql_cache()[select_cache_key(user_query, metadata, table_name)] = select_sql
+
+
+def generate_select_sql(user_query, metadata, table_name=TABLE_NAME):
+    system_prompt = build_select_prompt(metadata, table_name)
+
+    sql_cache = get_sql_cache()
+    cache_key = select_cache_key(user_query, metadata, table_name)
+    if cache_key in sql_cache:
+        print("[ANALYSIS CACHE HIT]")
+        return sql_cache[cache_key]
+
     response = client.chat.completions.create(
         model=deployment,
         messages=[
@@ -224,7 +301,9 @@ def generate_summary(user_query, result_df):
     if result_df.empty:
         return "No records matched the query."
 
-    preview = result_df.head(10).to_dict(orient="records")
+    # CSV states each column name once instead of repeating it in every
+    # row, which keeps the prompt (and the billed input tokens) small
+    preview = result_df.head(10).to_csv(index=False)
 
     system_prompt = """
 You are a data analyst.
@@ -242,7 +321,8 @@ User Question:
 {user_query}
 
 Query Result:
-{preview}
+```csv
+{preview}```
 """}
         ],
         temperature=0.2
@@ -259,32 +339,30 @@ Query Result:
 # =========================================================
 
 def process_file(file_path):
+    if file_path.endswith(".csv"):
+        print("Loading and cleaning file in DuckDB...")
+        load_and_clean_into_duckdb(file_path)
+
+        verify_table()
+
+        print("\nInitial pipeline completed successfully.\n")
+        return
+
     print("Loading file...")
     df = load_file(file_path)
 
     print("Cleaning data...")
     df = clean_data(df)
 
-    print("Extracting metadata...")
-    metadata = extract_dataframe_metadata(df)
-
-    print("Generating CREATE TABLE SQL...")
-    create_sql = generate_create_table_sql(metadata)
-
-    print("\nGenerated SQL:\n")
-    print(create_sql)
-
     print("\nStoring table...")
-    store_table(df, create_sql)
+    store_table(df)
 
     verify_table()
 
     print("\nInitial pipeline completed successfully.\n")
 
 
-if __name__ == "__main__":
-
-    file_path =  "testdata.csv" #"sample_SKUs.xlsx" # change as needed
+def run_session(file_path):
     process_file(file_path)
 
     # Extract metadata ONCE for interactive analysis
@@ -296,17 +374,18 @@ if __name__ == "__main__":
         if user_input.lower() == "exit":
             break
 
-        sql_query = generate_select_sql(user_input, metadata)
+        generated_sql = generate_select_sql(user_input, metadata)
 
-        if not is_safe_query(sql_query):
+        if not is_safe_query(generated_sql):
             print("Unsafe query blocked.")
             continue
 
-        sql_query = enforce_limit(sql_query)
+        sql_query = enforce_limit(generated_sql)
 
         print("\nGenerated SQL:\n", sql_query)
 
         result_df = execute_query(sql_query)
+        cache_select_sql(user_input, metadata, generated_sql)
 
         print("\n--- Result (First 10 Rows) ---\n")
         print(result_df.head(10))
@@ -315,3 +394,9 @@ if __name__ == "__main__":
 
         print("\n--- Summary ---\n")
         print(summary)
+
+
+if __name__ == "__main__":
+
+    file_path =  "testdata.csv" #"sample_SKUs.xlsx" # change as needed
+    run_session(file_path)